@@ -0,0 +1,423 @@
+"""Fritzing part parsing: categories, breadboard SVG geometry and the parts-directory scan.
+
+Kept free of the web app so process-pool workers can import it cheaply.
+"""
+import logging
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# Filename keywords for component categories, in priority order
+CATEGORY_KEYWORDS = [
+    ("Resistors", ["resistor", "resistance"]),
+    ("Capacitors", ["capacitor", "capacitance"]),
+    ("LEDs", ["led", "light"]),
+    ("Transistors", ["transistor", "mosfet", "fet"]),
+    ("ICs", ["ic", "chip", "logic"]),
+    ("Microcontrollers", ["arduino", "raspberry", "esp", "microcontroller"]),
+    ("Sensors", ["sensor", "detect"]),
+    ("Input", ["button", "switch", "potentiometer", "pot"]),
+    ("Output", ["display", "lcd", "led", "oled"]),
+    ("Connectors", ["connector", "header", "pin", "terminal"]),
+    ("Power", ["power", "battery", "voltage", "regulator"]),
+]
+CATEGORY_PRIORITY = [category for category, _ in CATEGORY_KEYWORDS]
+# One named group per category inside a zero-width lookahead, so finditer reports
+# every keyword occurrence (including overlapping ones) in a single C-level scan
+CATEGORY_RE = re.compile(
+    "(?=" + "|".join(f"(?P<{category}>{'|'.join(keywords)})" for category, keywords in CATEGORY_KEYWORDS) + ")",
+    re.IGNORECASE
+)
+
+# Helper function to extract category from filename or properties
+def extract_category(filename, properties):
+    """Pick a component category from its filename, family property or location"""
+    # Try to categorize by keywords in filename; the earliest listed category wins
+    matched = {match.lastgroup for match in CATEGORY_RE.finditer(filename)}
+    if matched:
+        return min(matched, key=CATEGORY_PRIORITY.index)
+    
+    # Try to get category from XML properties
+    if properties.get("family"):
+        return properties["family"]
+    
+    # Fallback to directory-based categorization
+    if "core" in str(filename):
+        return "Core"
+    elif "contrib" in str(filename):
+        return "Contrib"
+    elif "user" in str(filename):
+        return "User"
+    
+    return "Miscellaneous"
+
+# A length attribute's number and unit, e.g. "1.2in"
+_DIM_RE = re.compile(r'([\d.]+)([a-z]*)')
+
+# The root <svg ...> start tag (after any BOM, XML declaration, comments, processing
+# instructions and doctype), its element name, and the size attributes it may carry.
+# Each prolog item can match only one way, so a file that isn't an SVG fails in linear time
+_SVG_OPEN_RE = re.compile(
+    rb'(?:\xef\xbb\xbf)?'
+    rb'(?:\s|<\?(?:(?!\?>).)*\?>|<!--(?:(?!-->).)*-->|<!DOCTYPE[^>\[]*(?:\[[^\]]*\]\s*)?>)*'
+    rb'(<svg\b[^>]*>)',
+    re.I | re.S
+)
+_SVG_NAME_RE = re.compile(rb'<[^\s/>]+')
+_SVG_SIZE_ATTR_RE = re.compile(rb'\s+(?:(?:width|height)\s*=\s*(?:"[^"]*"|\'[^\']*\')|viewBox\s*=\s*(?:""|\'\'))')
+_SVG_VIEWBOX_RE = re.compile(rb'\sviewBox\s*=')
+_SVG_ATTR_RE = re.compile(rb'\s([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+def set_svg_size(svg_content: bytes, width, height) -> bytes:
+    """Set width/height on the root <svg> tag (and a viewBox if it has none) without parsing the document"""
+    match = _SVG_OPEN_RE.match(svg_content)
+    if not match:
+        return svg_content
+    start, end = match.span(1)
+    
+    # Already sized as asked: hand back the original bytes
+    attrs = {name: dq or sq for name, dq, sq in _SVG_ATTR_RE.findall(match.group(1))}
+    if (attrs.get(b"width") == str(width).encode() and attrs.get(b"height") == str(height).encode()
+            and attrs.get(b"viewBox")):
+        return svg_content
+    
+    tag = _SVG_SIZE_ATTR_RE.sub(b"", match.group(1))
+    size = f' width="{width}" height="{height}"'
+    if not _SVG_VIEWBOX_RE.search(tag):
+        size += f' viewBox="0 0 {width} {height}"'
+    
+    name_end = _SVG_NAME_RE.match(tag).end()
+    tag = tag[:name_end] + size.encode() + tag[name_end:]
+    return svg_content[:start] + tag + svg_content[end:]
+
+# Helper function to get SVG dimensions
+def get_svg_dimensions(svg_root):
+    """Get an SVG's size in pixels from its viewBox or width/height attributes"""
+    try:
+        if svg_root is None:
+            return {"width": 72, "height": 93.6}  # Default dimensions
+        
+        # First try to get dimensions from viewBox
+        viewbox = svg_root.get("viewBox")
+        if viewbox:
+            parts = viewbox.split(" ")
+            if len(parts) >= 4:
+                return {"width": float(parts[2]), "height": float(parts[3])}
+        
+        # If no viewBox, try width and height attributes
+        width = svg_root.get("width")
+        height = svg_root.get("height")
+        
+        if width and height:
+            # Handle units (px, in, etc.)
+            width_value = _DIM_RE.match(width)
+            height_value = _DIM_RE.match(height)
+            
+            if width_value and height_value:
+                w = float(width_value.group(1))
+                h = float(height_value.group(1))
+                
+                # Convert inches to pixels (assuming 72 DPI)
+                if width_value.group(2) == 'in':
+                    w *= 72
+                if height_value.group(2) == 'in':
+                    h *= 72
+                
+                return {"width": w, "height": h}
+        
+        return {"width": 72, "height": 93.6}  # Default dimensions
+    except Exception as e:
+        logger.warning(f"Error getting SVG dimensions: {e}")
+        return {"width": 72, "height": 93.6}  # Default dimensions
+
+# A path's leading absolute moveto, "M x y" or "M x,y"
+_PATH_M_RE = re.compile(r'^M\s*([-\d.]+)[ ,]([-\d.]+)')
+
+def _local_name(tag):
+    """Strip the {namespace} prefix lxml puts on element tags"""
+    return tag.rsplit('}', 1)[-1]
+
+# Helper function to parse connector positions from SVG
+def parse_connector_positions(svg_root, connectors):
+    """Move connectors to the positions of their matching elements in the breadboard SVG"""
+    if svg_root is None or not connectors:
+        return connectors
+    
+    try:
+        # Generator over (element, connector ID) matches in document order (elements only, not comments)
+        def find_elements_by_id(svg_root, connector_ids):
+            conn_id_set = set(connector_ids)
+            
+            # One pattern for all IDs, longest first so 'connector10pin' means connector10, not connector1
+            pattern = "|".join(re.escape(conn_id) for conn_id in sorted(conn_id_set, key=len, reverse=True) if conn_id)
+            conn_id_re = re.compile(pattern) if pattern else None
+            
+            for element in svg_root.iter(etree.Element):
+                element_id = element.get("id")
+                if not element_id:
+                    continue
+                
+                # Match pattern like 'connector0pin' for 'connector0' (an exact ID matches too)
+                if "pin" in element_id or "pad" in element_id:
+                    if element_id in conn_id_set:
+                        yield element, element_id
+                    elif conn_id_re is not None:
+                        match = conn_id_re.search(element_id)
+                        if match:
+                            yield element, match.group(0)
+                # Otherwise only an exact ID can match
+                elif element_id in conn_id_set:
+                    yield element, element_id
+        
+        # Get all connector IDs
+        connector_ids = [conn["id"] for conn in connectors]
+        
+        # Connector by ID (the first one wins if a part repeats an ID)
+        by_id = {conn["id"]: conn for conn in reversed(connectors)}
+        
+        # Find elements with matching IDs
+        matching_elements = find_elements_by_id(svg_root, connector_ids)
+        
+        # Connectors not yet pinned to a shape; the walk stops once this is empty
+        remaining = set(by_id)
+        
+        # Extract positions from matching elements
+        for element, conn_id in matching_elements:
+            # Find the connector in our list
+            connector = by_id.get(conn_id)
+            if not connector or conn_id not in remaining:
+                continue
+            
+            # Extract position based on element type
+            x, y = None, None
+            tag = _local_name(element.tag)
+            
+            # For circle elements (common for pins)
+            if tag == "circle":
+                x = float(element.get("cx", 0))
+                y = float(element.get("cy", 0))
+            
+            # For rect elements
+            elif tag == "rect":
+                x = float(element.get("x", 0)) + float(element.get("width", 0)) / 2
+                y = float(element.get("y", 0)) + float(element.get("height", 0)) / 2
+            
+            # For path elements, use first point
+            elif tag == "path":
+                m = _PATH_M_RE.match(element.get("d", ""))
+                if m:
+                    try:
+                        x, y = float(m.group(1)), float(m.group(2))
+                    except ValueError:
+                        pass
+            
+            # For line elements
+            elif tag == "line":
+                x = float(element.get("x1", 0))
+                y = float(element.get("y1", 0))
+            
+            # For other elements with x,y attributes
+            else:
+                x = float(element.get("x", 0))
+                y = float(element.get("y", 0))
+            
+            # Update connector position if found
+            if x is not None and y is not None:
+                connector["x"] = x
+                connector["y"] = y
+                
+                # A shape's position is final; a plain x/y fallback may still be bettered
+                if tag in ("circle", "rect", "path", "line"):
+                    remaining.discard(conn_id)
+                    if not remaining:
+                        break
+        
+        return connectors
+    except Exception as e:
+        logger.warning(f"Error parsing connector positions: {e}")
+        return connectors
+
+def parse_fzp(fzp_file: Path):
+    """Stream a Fritzing part file, returning its title, description, properties, tags and connectors"""
+    title = fzp_file.stem
+    description = ""
+    properties = {}
+    tags = []
+    connectors = []
+    
+    # Only the first <properties>, <tags> and <connectors> blocks count (later
+    # <connectors> blocks belong to schematic subparts)
+    owners = {}
+    
+    # Only the elements we use are handed back, each cleared once read
+    context = etree.iterparse(
+        str(fzp_file), events=("start", "end"), tag=("module", "property", "tag", "connector")
+    )
+    for event, elem in context:
+        if elem.tag == "module":
+            # The root's attributes are complete as soon as it opens
+            if event == "start" and elem.getparent() is None:
+                title = elem.get("title", title)
+                description = elem.get("description", description)
+            continue
+        if event == "start":
+            continue
+        
+        parent = elem.getparent()
+        parent_tag = parent.tag if parent is not None else None
+        if owners.setdefault(parent_tag, parent) is not parent:
+            continue
+        
+        if elem.tag == "property" and parent_tag == "properties":
+            prop_name = elem.get("name")
+            if prop_name and elem.text:
+                properties[prop_name] = elem.text
+        elif elem.tag == "tag" and parent_tag == "tags":
+            if elem.text:
+                tags.append(elem.text)
+        elif elem.tag == "connector" and parent_tag == "connectors":
+            conn_id = elem.get("id", "")
+            conn_name = elem.get("name", conn_id)
+            conn_type = elem.get("type", "male")
+            
+            # Try to get breadboard position
+            bb_elem = elem.find(".//p[@layer='breadboard']")
+            x, y = 0, 0
+            if bb_elem is not None:
+                x = float(bb_elem.get("x", 0))
+                y = float(bb_elem.get("y", 0))
+            
+            connectors.append({
+                "id": conn_id,
+                "name": conn_name,
+                "x": x,
+                "y": y,
+                "type": conn_type
+            })
+        else:
+            continue
+        
+        # Drop the element and the already-read siblings before it
+        elem.clear()
+        while elem.getprevious() is not None:
+            del parent[0]
+    
+    return title, description, properties, tags, connectors
+
+# Part SVG folders, highest priority first
+SVG_FOLDERS = ("core", "contrib", "user", "obsolete")
+
+def scan_svgs(fritzing_parts_dir: Path) -> Dict[Tuple[str, str], Path]:
+    """Map (fritzingId, view) to the part's SVG file, preferring core over contrib, user and obsolete"""
+    rank = {folder: i for i, folder in enumerate(SVG_FOLDERS)}
+    
+    # One walk over svg/<folder>/<view>/*.svg, then the best-ranked folder wins each slot
+    svg_files = [
+        svg_path for svg_path in (fritzing_parts_dir / "svg").glob("*/*/*.svg")
+        if svg_path.parent.parent.name in rank
+    ]
+    svg_files.sort(key=lambda svg_path: rank[svg_path.parent.parent.name])
+    
+    svg_index = {}
+    for svg_path in svg_files:
+        svg_index.setdefault((svg_path.stem, svg_path.parent.name), svg_path)
+    return svg_index
+
+def parse_component(fzp_file: Path, breadboard_svg: Optional[Path]) -> Optional[Dict]:
+    """Build one component (still without its id) from an FZP file, or None if it can't be parsed"""
+    try:
+        title, description, properties, tags, connectors = parse_fzp(fzp_file)
+        
+        # Extract basic component info
+        fritzingId = fzp_file.stem
+        category = extract_category(str(fzp_file), properties)
+        
+        # Initialize component
+        component = {
+            "fritzingId": fritzingId,
+            "title": title,
+            "description": description,
+            "category": category,
+            "tags": tags,
+            "connectors": connectors,
+            "properties": properties,
+            "dimensions": {"width": 72, "height": 93.6}  # Default dimensions
+        }
+        
+        # Get SVG for dimensions and connector positions
+        if breadboard_svg is not None:
+            # Parse once, straight from the file (libxml2 reads it and honours its encoding
+            # declaration); both helpers read the same tree
+            try:
+                svg_root = etree.parse(str(breadboard_svg)).getroot()
+            except etree.XMLSyntaxError as e:
+                logger.warning(f"Error parsing SVG for {fritzingId}: {e}")
+                svg_root = None
+            
+            # Get SVG dimensions
+            component["dimensions"] = get_svg_dimensions(svg_root)
+            
+            # Update connector positions from SVG
+            component["connectors"] = parse_connector_positions(svg_root, component["connectors"])
+        
+        return component
+    except Exception as e:
+        logger.warning(f"Failed to parse {fzp_file}: {e}")
+        return None
+
+# Below this many part files, starting worker processes costs more than it saves
+PARALLEL_MIN_FILES = 500
+
+def _usable_cpus() -> int:
+    """CPUs this process may run on (respects affinity masks and container limits where visible)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _pool_context():
+    """Fork workers from a forkserver (started once, with this module preloaded) rather than from
+    the multi-threaded server process; spawn them where forkserver isn't available (Windows)"""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+def scan_components(fritzing_parts_dir: Path, svg_index: Dict[Tuple[str, str], Path]) -> List[Dict]:
+    """Build the component list from every FZP file under the parts directory"""
+    fzp_files = list(fritzing_parts_dir.glob("**/*.fzp"))
+    breadboard_svgs = [svg_index.get((fzp_file.stem, "breadboard")) for fzp_file in fzp_files]
+    
+    # Part files are independent and parsing them is CPU bound, so fan out across processes
+    # when there are both several CPUs and enough files to pay for the workers
+    cpus = _usable_cpus()
+    if cpus > 1 and len(fzp_files) >= PARALLEL_MIN_FILES:
+        with ProcessPoolExecutor(max_workers=cpus, mp_context=_pool_context()) as executor:
+            parsed = list(executor.map(parse_component, fzp_files, breadboard_svgs, chunksize=32))
+    else:
+        parsed = map(parse_component, fzp_files, breadboard_svgs)
+    components = [component for component in parsed if component is not None]
+    
+    # Number them afterwards so ids follow file order, as before
+    for component_id, component in enumerate(components, start=1):
+        component["id"] = component_id
+        component["iconUrl"] = f"/api/components/{quote(component['fritzingId'], safe='')}/svg/icon"
+        component["breadboardUrl"] = f"/api/components/{quote(component['fritzingId'], safe='')}/svg/breadboard"
+        
+        # Share the strings that repeat across parts; unpickling the worker results
+        # gives every component its own copies
+        component["category"] = sys.intern(component["category"])
+        component["tags"] = [sys.intern(tag) for tag in component["tags"]]
+        for connector in component["connectors"]:
+            connector["type"] = sys.intern(connector["type"])
+    
+    return components
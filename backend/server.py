@@ -1,23 +1,38 @@
 from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
 import logging
-import json
+import signal
+import orjson
 import asyncio
-import subprocess
+import shutil
+import time
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
-import uuid
+from typing import List, Dict, Optional, Tuple, Union
+import hashlib
+import itertools
+import html
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
+from email.utils import formatdate
+import aiofiles
+import aiofiles.os
+
+# Imported as backend.server from the repo root, or as server from inside backend/
+try:
+    from .fritzing_parts import scan_components, scan_svgs, set_svg_size
+except ImportError:
+    from fritzing_parts import scan_components, scan_svgs, set_svg_size
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -40,22 +55,124 @@ logger = logging.getLogger(__name__)
 
 # WebSocket connection manager
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    # Outbound frames buffered per client before it is considered too slow
+    MAX_QUEUED_MESSAGES = 256
+    # Seconds to wait for queued frames to go out when a client disconnects
+    FLUSH_TIMEOUT = 2
+
+    def __init__(self, shard_count: Optional[int] = None):
+        # Connections are spread over shards so connect/disconnect on one shard
+        # never contends with a broadcast walking another
+        self.shard_count = shard_count or (os.cpu_count() or 1) * 4
+        # Each socket maps to its bounded outbound queue and the writer task draining it
+        self.shards: List[Dict[WebSocket, tuple]] = [{} for _ in range(self.shard_count)]
+        self.shard_locks = [asyncio.Lock() for _ in range(self.shard_count)]
+        # Shards are handed out round-robin on connect; each socket keeps the one it was given
+        self._next_shard = itertools.count()
+        self._shard_of: Dict[WebSocket, int] = {}
+        # Close handshakes of evicted clients, run in the background and kept referenced until done
+        self._closing: set = set()
+
+    @staticmethod
+    def _frame(message) -> dict:
+        """Build the ASGI send event for a message once so it can be shared by every client"""
+        if isinstance(message, bytes):
+            return {"type": "websocket.send", "bytes": message}
+        return {"type": "websocket.send", "text": message}
+
+    def _get(self, websocket: WebSocket):
+        index = self._shard_of.get(websocket)
+        if index is None:
+            return None
+        return self.shards[index].get(websocket)
+
+    async def _remove(self, websocket: WebSocket):
+        index = self._shard_of.get(websocket)
+        if index is None:
+            return None
+        async with self.shard_locks[index]:
+            self._shard_of.pop(websocket, None)
+            return self.shards[index].pop(websocket, None)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        queue = asyncio.Queue(maxsize=self.MAX_QUEUED_MESSAGES)
+        writer = asyncio.create_task(self._write_messages(websocket, queue))
+        index = next(self._next_shard) % self.shard_count
+        self._shard_of[websocket] = index
+        async with self.shard_locks[index]:
+            self.shards[index][websocket] = (queue, writer)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    async def _write_messages(self, websocket: WebSocket, queue: asyncio.Queue):
+        try:
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    break
+                await websocket.send(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Dropping WebSocket client after failed send: {e}")
+            await self._remove(websocket)
+            # Unblock any sender waiting on the full queue
+            while not queue.empty():
+                queue.get_nowait()
+
+    async def disconnect(self, websocket: WebSocket):
+        """Flush the client's queued messages and stop its writer"""
+        entry = await self._remove(websocket)
+        if not entry:
+            return
+        queue, writer = entry
+        try:
+            queue.put_nowait(None)
+            await asyncio.wait_for(writer, timeout=self.FLUSH_TIMEOUT)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            writer.cancel()
+
+    def evict(self, websocket: WebSocket):
+        """Drop a client that can't keep up, discarding its queued messages"""
+        # Removed without awaiting, so a broadcast never waits on the slow client
+        index = self._shard_of.pop(websocket, None)
+        entry = self.shards[index].pop(websocket, None) if index is not None else None
+        if entry:
+            entry[1].cancel()
+        task = asyncio.create_task(self._close_quietly(websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await websocket.close(code=1008, reason="Client too slow")
+        except Exception:
+            pass
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+        entry = self._get(websocket)
+        if entry:
+            # Waiting for queue space keeps per-client output in order
+            await entry[0].put(self._frame(message))
+        else:
+            await websocket.send_text(message)
+
+    async def _broadcast_shard(self, index: int, frame: dict):
+        for websocket, (queue, _) in list(self.shards[index].items()):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                logger.warning("Evicting WebSocket client with a full outbound queue")
+                self.evict(websocket)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+    async def broadcast(self, message: Union[str, bytes]):
+        """Send a message to every client; bytes are sent once-encoded as binary frames"""
+        # Every queue receives the same frame object; nothing is rebuilt or copied per client
+        frame = self._frame(message)
+        await asyncio.gather(*(
+            self._broadcast_shard(index, frame)
+            for index, shard in enumerate(self.shards) if shard
+        ))
 
 manager = ConnectionManager()
 
@@ -84,118 +201,221 @@ class CoreRequest(BaseModel):
 class LibrarySearchRequest(BaseModel):
     query: str = ""
 
+# Last line of a streamed arduino-cli run, followed by the process exit code
+EXIT_CODE_MARKER = "[arduino-cli exit code] "
+
 # Arduino CLI wrapper functions
-def run_arduino_cli(command: List[str]) -> Dict:
+def find_arduino_cli():
+    """Locate the arduino-cli executable and build the environment to run it with"""
+    # Add arduino-cli to PATH - check multiple possible locations
+    env = os.environ.copy()
+    
+    # Try different possible bin paths
+    possible_bin_paths = [
+        ROOT_DIR.parent / 'bin',                # ../bin
+        ROOT_DIR.parent.parent / 'bin',        # ../../bin
+        ROOT_DIR / 'bin',                      # ./bin
+        Path('/app/bin')                       # Docker path
+    ]
+    
+    # Use arduino-cli.exe on Windows
+    cli_exe = 'arduino-cli.exe' if os.name == 'nt' else 'arduino-cli'
+    
+    # Find the first path that exists and contains arduino-cli
+    bin_path = None
+    for path in possible_bin_paths:
+        test_path = path / cli_exe
+        if test_path.exists():
+            bin_path = str(path)
+            logger.info(f"Found Arduino CLI at: {test_path}")
+            break
+    
+    if not bin_path:
+        # If not found in predefined locations, try the one in the current directory
+        bin_path = str(ROOT_DIR.parent / 'bin')
+        logger.warning(f"Arduino CLI not found in standard locations, defaulting to: {bin_path}")
+    
+    env['PATH'] = f"{bin_path}{os.pathsep}{env.get('PATH', '')}"
+    # Set HOME to a Windows-compatible path
+    env['HOME'] = str(ROOT_DIR)
+    
+    return str(Path(bin_path) / cli_exe), env
+
+# Resolved once at import; every arduino-cli invocation reuses the path and environment
+CLI_PATH, BASE_ENV = find_arduino_cli()
+CLI_NOT_FOUND = f"Arduino CLI executable not found at {CLI_PATH}"
+
+class CliResult(dict):
+    """arduino-cli result; 'stdout' is decoded from 'stdout_bytes' only when first read"""
+    def __missing__(self, key):
+        if key == 'stdout':
+            self['stdout'] = self['stdout_bytes'].decode('utf-8', errors='replace')
+            return self['stdout']
+        raise KeyError(key)
+
+async def run_arduino_cli(command: List[str]) -> Dict:
     """Run arduino-cli command and return result"""
     try:
-        # Add arduino-cli to PATH - check multiple possible locations
-        env = os.environ.copy()
-        
-        # Try different possible bin paths
-        possible_bin_paths = [
-            ROOT_DIR.parent / 'bin',                # ../bin
-            ROOT_DIR.parent.parent / 'bin',        # ../../bin
-            ROOT_DIR / 'bin',                      # ./bin
-            Path('/app/bin')                       # Docker path
-        ]
-        
-        # Find the first path that exists and contains arduino-cli
-        bin_path = None
-        for path in possible_bin_paths:
-            cli_exe = 'arduino-cli.exe' if os.name == 'nt' else 'arduino-cli'
-            test_path = path / cli_exe
-            if test_path.exists():
-                bin_path = str(path)
-                logger.info(f"Found Arduino CLI at: {test_path}")
-                break
-        
-        if not bin_path:
-            # If not found in predefined locations, try the one in the current directory
-            bin_path = str(ROOT_DIR.parent / 'bin')
-            logger.warning(f"Arduino CLI not found in standard locations, defaulting to: {bin_path}")
-        
-        env['PATH'] = f"{bin_path};{env.get('PATH', '')}"
-        # Set HOME to a Windows-compatible path
-        env['HOME'] = str(ROOT_DIR)
-        
-        # Use arduino-cli.exe on Windows
-        if command[0] == 'arduino-cli' and os.name == 'nt':
-            command[0] = 'arduino-cli.exe'
-            
-        # Log the command being executed
-        logger.info(f"Executing command: {' '.join(command)}")
-        logger.info(f"Using bin_path: {bin_path}")
-        
-        # Check if the executable exists
-        cli_path = Path(bin_path) / command[0]
-        if not cli_path.exists():
-            return {
-                'success': False,
-                'stdout': '',
-                'stderr': f"Arduino CLI executable not found at {cli_path}",
-                'returncode': -1
-            }
-        
         # Execute the command with full path
-        command[0] = str(cli_path)
-        logger.info(f"Full command path: {command[0]}")
+        command[0] = CLI_PATH
+        logger.info(f"Executing command: {' '.join(command)}")
         
-        # Run with binary output to avoid encoding issues
-        result = subprocess.run(
-            command,
-            capture_output=True,
-            text=False,  # Changed to binary mode
-            env=env
+        # Run without blocking the event loop, with binary output to avoid encoding issues
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=BASE_ENV
         )
+        stdout, stderr = await proc.communicate()
         
-        # Decode stdout and stderr with error handling
-        stdout_str = result.stdout.decode('utf-8', errors='replace') if result.stdout else ''
-        stderr_str = result.stderr.decode('utf-8', errors='replace') if result.stderr else ''
+        # Keep stdout as bytes so JSON callers can parse it without decoding first
+        stderr_str = stderr.decode('utf-8', errors='replace') if stderr else ''
         
-        return {
-            'success': result.returncode == 0,
-            'stdout': stdout_str,
+        return CliResult({
+            'success': proc.returncode == 0,
+            'stdout_bytes': stdout or b'',
             'stderr': stderr_str,
-            'returncode': result.returncode
-        }
+            'returncode': proc.returncode
+        })
+    except FileNotFoundError:
+        return CliResult({
+            'success': False,
+            'stdout_bytes': b'',
+            'stderr': CLI_NOT_FOUND,
+            'returncode': -1
+        })
     except Exception as e:
-        return {
+        return CliResult({
             'success': False,
-            'stdout': '',
+            'stdout_bytes': b'',
             'stderr': str(e),
             'returncode': -1
-        }
+        })
+
+async def stream_arduino_cli(command: List[str]):
+    """Run arduino-cli command and yield its output line by line as it is produced"""
+    command[0] = CLI_PATH
+    logger.info(f"Streaming command: {' '.join(command)}")
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=BASE_ENV
+        )
+    except FileNotFoundError:
+        yield f"{CLI_NOT_FOUND}\n"
+        yield f"{EXIT_CODE_MARKER}-1\n"
+        return
+
+    try:
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                break
+            yield line.decode('utf-8', errors='replace')
+        
+        # Finish with a sentinel line carrying the exit code
+        returncode = await proc.wait()
+        yield f"{EXIT_CODE_MARKER}{returncode}\n"
+    finally:
+        # The client went away mid-stream; don't leave arduino-cli running
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+# Cached arduino-cli results: command tuple -> (expiry timestamp, result dict with parsed 'data')
+_cli_cache: Dict[tuple, tuple] = {}
+# Runs currently in flight, shared by every caller asking for the same command
+_cli_inflight: Dict[tuple, asyncio.Task] = {}
+# Bumped on invalidation so runs started before it don't repopulate the cache
+_cli_generation = 0
+
+# Cache lifetimes in seconds for the JSON list/search commands
+BOARD_LISTALL_TTL = 300
+CORE_SEARCH_TTL = 300
+LIB_SEARCH_TTL = 300
+CORE_LIST_TTL = 60
+LIB_LIST_TTL = 60
+PORT_LIST_TTL = 30
+
+async def _fetch_cli_json(key: tuple, ttl: float) -> Dict:
+    generation = _cli_generation
+    try:
+        result = await run_arduino_cli(list(key))
+        result['data'] = None
+        if result['success']:
+            try:
+                result['data'] = orjson.loads(result['stdout_bytes'])
+            except orjson.JSONDecodeError:
+                return result
+            
+            if generation == _cli_generation:
+                now = time.monotonic()
+                # Drop expired entries so one-off search queries don't accumulate
+                for stale_key in [k for k, (expiry, _) in _cli_cache.items() if expiry <= now]:
+                    del _cli_cache[stale_key]
+                _cli_cache[key] = (now + ttl, result)
+        return result
+    finally:
+        if _cli_inflight.get(key) is asyncio.current_task():
+            del _cli_inflight[key]
+
+async def cached_cli(command: List[str], ttl: float) -> Dict:
+    """Run a JSON arduino-cli command, memoizing the parsed output for ttl seconds"""
+    key = tuple(command)
+    cached = _cli_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    # Single flight: while one run is in progress, other callers await its result
+    # instead of spawning their own arduino-cli process
+    task = _cli_inflight.get(key)
+    if task is None:
+        task = _cli_inflight[key] = asyncio.create_task(_fetch_cli_json(key, ttl))
+    # Shielded so one caller going away doesn't cancel the run for the others
+    return await asyncio.shield(task)
+
+def invalidate_cli_cache(*subcommands: tuple):
+    """Forget cached results for commands starting with any of the given subcommands"""
+    global _cli_generation
+    _cli_generation += 1
+    for key in list(_cli_cache):
+        if any(key[1:1 + len(sub)] == sub for sub in subcommands):
+            del _cli_cache[key]
+    for key in list(_cli_inflight):
+        if any(key[1:1 + len(sub)] == sub for sub in subcommands):
+            del _cli_inflight[key]
 
 # API Routes
 @api_router.get("/")
 async def root():
     return {"message": "Arduino Code Editor API"}
 
+# Successful list responses are returned as ready-made responses so FastAPI
+# doesn't walk the (often large) payload through jsonable_encoder first
 @api_router.get("/boards")
 async def get_boards():
     """Get list of available boards"""
-    result = run_arduino_cli(['arduino-cli', 'board', 'listall', '--format', 'json'])
+    result = await cached_cli(['arduino-cli', 'board', 'listall', '--format', 'json'], BOARD_LISTALL_TTL)
     
     if result['success']:
-        try:
-            boards = json.loads(result['stdout'])
-            return {"success": True, "boards": boards.get('boards', [])}
-        except json.JSONDecodeError:
+        if result['data'] is None:
             return {"success": False, "error": "Failed to parse board list"}
+        return ORJSONResponse({"success": True, "boards": result['data'].get('boards', [])})
     
     return {"success": False, "error": result['stderr']}
 
 @api_router.get("/boards/available")
 async def get_available_boards():
     """Get list of all available boards for installation"""
-    result = run_arduino_cli(['arduino-cli', 'board', 'listall', '--format', 'json'])
+    result = await cached_cli(['arduino-cli', 'board', 'listall', '--format', 'json'], BOARD_LISTALL_TTL)
     
     if result['success']:
-        try:
-            boards = json.loads(result['stdout'])
-            return {"success": True, "boards": boards.get('boards', [])}
-        except json.JSONDecodeError:
+        if result['data'] is None:
             return {"success": False, "error": "Failed to parse available boards"}
+        return ORJSONResponse({"success": True, "boards": result['data'].get('boards', [])})
     
     return {"success": False, "error": result['stderr']}
 
@@ -203,51 +423,47 @@ async def get_available_boards():
 async def search_libraries(request: LibrarySearchRequest):
     """Search for libraries"""
     if request.query:
-        result = run_arduino_cli(['arduino-cli', 'lib', 'search', request.query, '--format', 'json'])
+        result = await cached_cli(['arduino-cli', 'lib', 'search', request.query, '--format', 'json'], LIB_SEARCH_TTL)
     else:
-        result = run_arduino_cli(['arduino-cli', 'lib', 'search', '--format', 'json'])
+        result = await cached_cli(['arduino-cli', 'lib', 'search', '--format', 'json'], LIB_SEARCH_TTL)
     
     if result['success']:
-        try:
-            libraries = json.loads(result['stdout'])
-            return {"success": True, "libraries": libraries.get('libraries', [])}
-        except json.JSONDecodeError:
+        if result['data'] is None:
             return {"success": False, "error": "Failed to parse library search results"}
+        return ORJSONResponse({"success": True, "libraries": result['data'].get('libraries', [])})
     
     return {"success": False, "error": result['stderr']}
 
 @api_router.get("/cores")
 async def get_cores():
     """Get list of installed cores"""
-    result = run_arduino_cli(['arduino-cli', 'core', 'list', '--format', 'json'])
+    result = await cached_cli(['arduino-cli', 'core', 'list', '--format', 'json'], CORE_LIST_TTL)
     
     if result['success']:
-        try:
-            cores = json.loads(result['stdout'])
-            return {"success": True, "cores": cores.get('platforms', [])}
-        except json.JSONDecodeError:
+        if result['data'] is None:
             return {"success": False, "error": "Failed to parse cores"}
+        return ORJSONResponse({"success": True, "cores": result['data'].get('platforms', [])})
     
     return {"success": False, "error": result['stderr']}
 
 @api_router.get("/cores/search")
 async def search_cores():
     """Get list of all available cores for installation"""
-    result = run_arduino_cli(['arduino-cli', 'core', 'search', '--format', 'json'])
+    result = await cached_cli(['arduino-cli', 'core', 'search', '--format', 'json'], CORE_SEARCH_TTL)
     
     if result['success']:
-        try:
-            cores = json.loads(result['stdout'])
-            return {"success": True, "platforms": cores.get('platforms', [])}
-        except json.JSONDecodeError:
+        if result['data'] is None:
             return {"success": False, "error": "Failed to parse available cores"}
+        return ORJSONResponse({"success": True, "platforms": result['data'].get('platforms', [])})
     
     return {"success": False, "error": result['stderr']}
 
 @api_router.post("/cores/install")
 async def install_core(request: CoreRequest):
     """Install a core"""
-    result = run_arduino_cli(['arduino-cli', 'core', 'install', request.core_name])
+    result = await run_arduino_cli(['arduino-cli', 'core', 'install', request.core_name])
+    # Installed cores determine both the core listings and the known boards
+    invalidate_cli_cache(('core',), ('board', 'listall'))
     
     return {
         "success": result['success'],
@@ -257,7 +473,8 @@ async def install_core(request: CoreRequest):
 @api_router.post("/cores/uninstall")
 async def uninstall_core(request: CoreRequest):
     """Uninstall a core"""
-    result = run_arduino_cli(['arduino-cli', 'core', 'uninstall', request.core_name])
+    result = await run_arduino_cli(['arduino-cli', 'core', 'uninstall', request.core_name])
+    invalidate_cli_cache(('core',), ('board', 'listall'))
     
     return {
         "success": result['success'],
@@ -267,35 +484,36 @@ async def uninstall_core(request: CoreRequest):
 @api_router.get("/ports")
 async def get_ports():
     """Get list of available COM ports"""
-    result = run_arduino_cli(['arduino-cli', 'board', 'list', '--format', 'json'])
+    result = await cached_cli(['arduino-cli', 'board', 'list', '--format', 'json'], PORT_LIST_TTL)
     
     if result['success']:
-        try:
-            ports = json.loads(result['stdout'])
-            return {"success": True, "ports": ports}
-        except json.JSONDecodeError:
+        if result['data'] is None:
             return {"success": False, "error": "Failed to parse port list"}
+        # Splice the CLI's already valid JSON into the response as-is
+        return Response(
+            content=b'{"success":true,"ports":' + result['stdout_bytes'] + b'}',
+            media_type='application/json'
+        )
     
     return {"success": False, "error": result['stderr']}
 
 @api_router.get("/libraries")
 async def get_libraries():
     """Get list of installed libraries"""
-    result = run_arduino_cli(['arduino-cli', 'lib', 'list', '--format', 'json'])
+    result = await cached_cli(['arduino-cli', 'lib', 'list', '--format', 'json'], LIB_LIST_TTL)
     
     if result['success']:
-        try:
-            libraries = json.loads(result['stdout'])
-            return {"success": True, "libraries": libraries.get('installed_libraries', [])}
-        except json.JSONDecodeError:
+        if result['data'] is None:
             return {"success": False, "error": "Failed to parse library list"}
+        return ORJSONResponse({"success": True, "libraries": result['data'].get('installed_libraries', [])})
     
     return {"success": False, "error": result['stderr']}
 
 @api_router.post("/libraries/install")
 async def install_library(request: LibraryRequest):
     """Install a library"""
-    result = run_arduino_cli(['arduino-cli', 'lib', 'install', request.library_name])
+    result = await run_arduino_cli(['arduino-cli', 'lib', 'install', request.library_name])
+    invalidate_cli_cache(('lib',))
     
     return {
         "success": result['success'],
@@ -305,82 +523,186 @@ async def install_library(request: LibraryRequest):
 @api_router.post("/libraries/uninstall")
 async def uninstall_library(request: LibraryRequest):
     """Uninstall a library"""
-    result = run_arduino_cli(['arduino-cli', 'lib', 'uninstall', request.library_name])
+    result = await run_arduino_cli(['arduino-cli', 'lib', 'uninstall', request.library_name])
+    invalidate_cli_cache(('lib',))
     
     return {
         "success": result['success'],
         "message": result['stdout'] if result['success'] else result['stderr']
     }
 
+# Sketch directories are reused across requests with the same source, so repeat
+# compiles skip the write and hit arduino-cli's build cache: hash -> sketch mtime_ns
+SKETCH_DIR_CACHE_SIZE = 32
+_sketch_dirs: "OrderedDict[str, int]" = OrderedDict()
+_sketch_locks: Dict[str, asyncio.Lock] = {}
+# Requests holding or waiting on each sketch lock; a lock is dropped once this reaches zero
+_sketch_users: Dict[str, int] = {}
+
+def sketch_root() -> Path:
+    return Path(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')))
+
+def sketch_dir_path(digest: str) -> Path:
+    return sketch_root() / f"arduino_sketch_{digest}"
+
+def remove_stale_sketch_dirs():
+    """Remove sketch directories left behind by a previous run"""
+    for path in sketch_root().glob("arduino_sketch_*"):
+        shutil.rmtree(path, ignore_errors=True)
+
+@asynccontextmanager
+async def hold_sketch(digest: str):
+    """Hold the lock for a sketch directory, counting waiters so it is never dropped while in use"""
+    lock = _sketch_locks.setdefault(digest, asyncio.Lock())
+    _sketch_users[digest] = _sketch_users.get(digest, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _sketch_users[digest] -= 1
+        if not _sketch_users[digest]:
+            del _sketch_users[digest]
+            del _sketch_locks[digest]
+
+@asynccontextmanager
+async def sketch_dir(code: str):
+    """Provide a directory holding the sketch, held exclusively while arduino-cli uses it"""
+    digest = hashlib.blake2b(code.encode('utf-8'), digest_size=16).hexdigest()
+    temp_dir = sketch_dir_path(digest)
+    # Sketch file name must match its directory
+    sketch_file = temp_dir / f"{temp_dir.name}.ino"
+    
+    async with hold_sketch(digest):
+        try:
+            reusable = (await aiofiles.os.stat(sketch_file)).st_mtime_ns == _sketch_dirs.get(digest)
+        except FileNotFoundError:
+            reusable = False
+        
+        if not reusable:
+            await aiofiles.os.makedirs(temp_dir, exist_ok=True)
+            async with aiofiles.open(sketch_file, 'w') as f:
+                await f.write(code)
+            _sketch_dirs[digest] = (await aiofiles.os.stat(sketch_file)).st_mtime_ns
+        _sketch_dirs.move_to_end(digest)
+        
+        # Evict the least recently used directories that aren't in use
+        for old_digest in list(_sketch_dirs)[:-SKETCH_DIR_CACHE_SIZE]:
+            # Skip sketches in use, and ones another request has already evicted
+            if old_digest in _sketch_users or _sketch_dirs.pop(old_digest, None) is None:
+                continue
+            # Held while deleting so a new request for the same sketch waits for the removal
+            async with hold_sketch(old_digest):
+                await asyncio.to_thread(shutil.rmtree, sketch_dir_path(old_digest), ignore_errors=True)
+        
+        yield temp_dir
+
 @api_router.post("/compile")
 async def compile_code(request: CompileRequest):
     """Compile Arduino code"""
-    # Create temp directory for sketch
-    temp_dir = Path(os.path.join(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')), f"arduino_sketch_{uuid.uuid4()}"))
-    temp_dir.mkdir(exist_ok=True, parents=True)
-    
-    # Write sketch file
-    sketch_file = temp_dir / f"{temp_dir.name}.ino"
-    sketch_file.write_text(request.code)
-    
-    # Compile
-    result = run_arduino_cli([
-        'arduino-cli', 'compile',
-        '--fqbn', request.board,
-        str(temp_dir)
-    ])
-    
-    # Cleanup
-    import shutil
-    shutil.rmtree(temp_dir, ignore_errors=True)
+    async with sketch_dir(request.code) as temp_dir:
+        # Compile
+        result = await run_arduino_cli([
+            'arduino-cli', 'compile',
+            '--fqbn', request.board,
+            str(temp_dir)
+        ])
     
     return {
         "success": result['success'],
         "message": result['stdout'] if result['success'] else result['stderr']
     }
 
+@api_router.post("/compile/stream")
+async def compile_code_stream(request: CompileRequest):
+    """Compile Arduino code, streaming compiler output as it is produced"""
+    async def output():
+        async with sketch_dir(request.code) as temp_dir:
+            async for line in stream_arduino_cli([
+                'arduino-cli', 'compile',
+                '--fqbn', request.board,
+                str(temp_dir)
+            ]):
+                yield line
+    
+    return StreamingResponse(output(), media_type='text/plain')
+
 @api_router.post("/upload")
 async def upload_code(request: UploadRequest):
     """Upload Arduino code to board"""
-    # Create temp directory for sketch
-    temp_dir = Path(os.path.join(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')), f"arduino_sketch_{uuid.uuid4()}"))
-    temp_dir.mkdir(exist_ok=True, parents=True)
-    
-    # Write sketch file
-    sketch_file = temp_dir / f"{temp_dir.name}.ino"
-    sketch_file.write_text(request.code)
-    
-    # Upload
-    result = run_arduino_cli([
-        'arduino-cli', 'upload',
-        '--fqbn', request.board,
-        '--port', request.port,
-        str(temp_dir)
-    ])
-    
-    # Cleanup
-    import shutil
-    shutil.rmtree(temp_dir, ignore_errors=True)
+    async with sketch_dir(request.code) as temp_dir:
+        # Upload
+        result = await run_arduino_cli([
+            'arduino-cli', 'upload',
+            '--fqbn', request.board,
+            '--port', request.port,
+            str(temp_dir)
+        ])
     
     return {
         "success": result['success'],
         "message": result['stdout'] if result['success'] else result['stderr']
     }
 
+@api_router.post("/upload/stream")
+async def upload_code_stream(request: UploadRequest):
+    """Upload Arduino code to board, streaming uploader output as it is produced"""
+    async def output():
+        async with sketch_dir(request.code) as temp_dir:
+            async for line in stream_arduino_cli([
+                'arduino-cli', 'upload',
+                '--fqbn', request.board,
+                '--port', request.port,
+                str(temp_dir)
+            ]):
+                yield line
+    
+    return StreamingResponse(output(), media_type='text/plain')
+
+def resolve_file_path(path: str) -> Path:
+    """Map frontend /tmp/arduino_workspace paths onto the actual workspace directory"""
+    if path.startswith('/tmp/arduino_workspace/'):
+        workspace_dir = Path(os.path.join(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')), "arduino_workspace"))
+        return workspace_dir / path.replace('/tmp/arduino_workspace/', '')
+    return Path(path)
+
+# Registered before /files/{file_path:path} so "raw" isn't taken as a file path
+@api_router.get("/files/raw")
+async def get_file_raw(path: str):
+    """Stream file content as plain text"""
+    file_path = resolve_file_path(path)
+    if not await aiofiles.os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(file_path, media_type='text/plain')
+
+@api_router.post("/files/raw")
+async def save_file_raw(path: str, request: Request):
+    """Save the raw request body to a file, writing it chunk by chunk"""
+    try:
+        file_path = resolve_file_path(path)
+        logger.info(f"Saving raw file: {file_path}")
+        await aiofiles.os.makedirs(file_path.parent, exist_ok=True)
+        
+        file_size = 0
+        async with aiofiles.open(file_path, 'wb') as f:
+            async for chunk in request.stream():
+                await f.write(chunk)
+                file_size += len(chunk)
+        invalidate_workspace_cache()
+        
+        logger.info(f"File saved successfully: {file_path}, Size: {file_size} bytes")
+        return {"success": True, "message": f"File saved successfully. Size: {file_size} bytes"}
+    except Exception as e:
+        logger.error(f"Error saving file: {str(e)}")
+        return {"success": False, "error": str(e)}
+
 @api_router.get("/files/{file_path:path}")
 async def get_file(file_path: str):
     """Get file content by path parameter"""
     try:
-        # Handle paths that start with /tmp/arduino_workspace
-        if file_path.startswith('/tmp/arduino_workspace/'):
-            # Replace with the actual workspace directory
-            workspace_dir = Path(os.path.join(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')), "arduino_workspace"))
-            relative_path = file_path.replace('/tmp/arduino_workspace/', '')
-            file_path = workspace_dir / relative_path
-        else:
-            file_path = Path(file_path)
-        if file_path.exists() and file_path.is_file():
-            content = file_path.read_text()
+        file_path = resolve_file_path(file_path)
+        if await aiofiles.os.path.isfile(file_path):
+            async with aiofiles.open(file_path, 'r') as f:
+                content = await f.read()
             return {"success": True, "content": content}
         else:
             return {"success": False, "error": "File not found"}
@@ -392,18 +714,11 @@ async def get_file_by_query(path: str):
     """Get file content by query parameter"""
     try:
         logger.info(f"Loading file by query parameter: {path}")
-        # Handle paths that start with /tmp/arduino_workspace
-        if path.startswith('/tmp/arduino_workspace/'):
-            # Replace with the actual workspace directory
-            workspace_dir = Path(os.path.join(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')), "arduino_workspace"))
-            relative_path = path.replace('/tmp/arduino_workspace/', '')
-            file_path = workspace_dir / relative_path
-            logger.info(f"Mapped path: {file_path}")
-        else:
-            file_path = Path(path)
-            logger.info(f"Direct path: {file_path}")
-        if file_path.exists() and file_path.is_file():
-            content = file_path.read_text()
+        file_path = resolve_file_path(path)
+        logger.info(f"Resolved path: {file_path}")
+        if await aiofiles.os.path.isfile(file_path):
+            async with aiofiles.open(file_path, 'r') as f:
+                content = await f.read()
             logger.info(f"File loaded successfully: {file_path}, Size: {len(content)} bytes")
             return {"success": True, "content": content}
         else:
@@ -422,19 +737,11 @@ async def save_file(file_data: FileContent):
         # Log the incoming request
         logger.info(f"Saving file: {file_data.path}, Content length: {len(file_data.content)}")
         
-        # Handle paths that start with /tmp/arduino_workspace
-        if file_data.path.startswith('/tmp/arduino_workspace/'):
-            # Replace with the actual workspace directory
-            workspace_dir = Path(os.path.join(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')), "arduino_workspace"))
-            relative_path = file_data.path.replace('/tmp/arduino_workspace/', '')
-            file_path = workspace_dir / relative_path
-            logger.info(f"Mapped path: {file_path}")
-        else:
-            file_path = Path(file_data.path)
-            logger.info(f"Direct path: {file_path}")
+        file_path = resolve_file_path(file_data.path)
+        logger.info(f"Resolved path: {file_path}")
         
         # Ensure parent directory exists
-        file_path.parent.mkdir(parents=True, exist_ok=True)
+        await aiofiles.os.makedirs(file_path.parent, exist_ok=True)
         
         # Check if it's an .ino or .fzz file
         is_ino_file = file_path.suffix.lower() == '.ino'
@@ -445,25 +752,26 @@ async def save_file(file_data: FileContent):
             logger.info(f"Detected .fzz file: {file_path}")
         
         # Write the file content
-        with open(file_path, 'w', newline='') as f:
-            f.write(file_data.content)
+        async with aiofiles.open(file_path, 'w', newline='') as f:
+            await f.write(file_data.content)
+        invalidate_workspace_cache()
         
         # Verify the file was written
-        if file_path.exists():
-            file_size = file_path.stat().st_size
+        if await aiofiles.os.path.exists(file_path):
+            file_size = (await aiofiles.os.stat(file_path)).st_size
             logger.info(f"File saved successfully: {file_path}, Size: {file_size} bytes")
             
             # Double-check content for .ino and .fzz files
             if is_ino_file or is_fzz_file:
-                with open(file_path, 'r') as f:
-                    saved_content = f.read()
+                async with aiofiles.open(file_path, 'r') as f:
+                    saved_content = await f.read()
                 if saved_content != file_data.content:
                     file_type = ".ino" if is_ino_file else ".fzz"
                     logger.error(f"Content mismatch for {file_type} file: {file_path}")
                     logger.error(f"Expected length: {len(file_data.content)}, Actual length: {len(saved_content)}")
                     # Try again with binary mode
-                    with open(file_path, 'wb') as f:
-                        f.write(file_data.content.encode('utf-8'))
+                    async with aiofiles.open(file_path, 'wb') as f:
+                        await f.write(file_data.content.encode('utf-8'))
                     logger.info(f"Retried saving {file_type} file in binary mode: {file_path}")
             
             return {"success": True, "message": f"File saved successfully. Size: {file_size} bytes"}
@@ -480,14 +788,7 @@ async def save_file(file_data: FileContent):
 async def delete_file(path: str):
     """Delete a file"""
     try:
-        # Handle paths that start with /tmp/arduino_workspace
-        if path.startswith('/tmp/arduino_workspace/'):
-            # Replace with the actual workspace directory
-            workspace_dir = Path(os.path.join(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')), "arduino_workspace"))
-            relative_path = path.replace('/tmp/arduino_workspace/', '')
-            file_path = workspace_dir / relative_path
-        else:
-            file_path = Path(path)
+        file_path = resolve_file_path(path)
         
         # Log file deletion attempt
         logger.info(f"Attempting to delete file: {file_path}")
@@ -498,8 +799,9 @@ async def delete_file(path: str):
         elif file_path.suffix.lower() == '.fzz':
             logger.info(f"Deleting .fzz file: {file_path}")
             
-        if file_path.exists() and file_path.is_file():
-            file_path.unlink()
+        if await aiofiles.os.path.isfile(file_path):
+            await aiofiles.os.remove(file_path)
+            invalidate_workspace_cache()
             logger.info(f"File deleted successfully: {file_path}")
             return {"success": True, "message": "File deleted successfully"}
         else:
@@ -511,74 +813,92 @@ async def delete_file(path: str):
         logger.error(traceback.format_exc())
         return {"success": False, "error": str(e)}
 
-@api_router.get("/workspace")
-async def get_workspace():
-    """Get workspace file tree"""
-    workspace_dir = Path(os.path.join(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')), "arduino_workspace"))
-    workspace_dir.mkdir(exist_ok=True, parents=True)
-    
-    def build_tree(path: Path):
-        tree = []
-        try:
-            for item in path.iterdir():
-                if item.is_file():
-                    # Get file size for all files
-                    file_size = item.stat().st_size
-                    
+def build_tree(path):
+    """Recursively list a directory as a file tree"""
+    tree = []
+    try:
+        # scandir gets each entry's type from the directory listing itself,
+        # so only files need a stat call (for their size)
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
                     # Create file entry with additional metadata
                     file_entry = {
-                        "name": item.name,
-                        "path": str(item),
+                        "name": entry.name,
+                        "path": entry.path,
                         "type": "file",
-                        "size": file_size
+                        "size": entry.stat().st_size
                     }
                     
                     # Add file type information for .ino and .fzz files
-                    if item.suffix.lower() == '.ino':
+                    suffix = os.path.splitext(entry.name)[1].lower()
+                    if suffix == '.ino':
                         file_entry["file_type"] = "arduino"
-                    elif item.suffix.lower() == '.fzz':
+                    elif suffix == '.fzz':
                         file_entry["file_type"] = "circuit"
                     
                     tree.append(file_entry)
-                elif item.is_dir():
+                elif entry.is_dir(follow_symlinks=False):
                     tree.append({
-                        "name": item.name,
-                        "path": str(item),
+                        "name": entry.name,
+                        "path": entry.path,
                         "type": "directory",
-                        "children": build_tree(item)
+                        "children": build_tree(entry.path)
                     })
-        except PermissionError:
-            logger.error(f"Permission error accessing {path}")
-            pass
-        except Exception as e:
-            logger.error(f"Error building tree for {path}: {str(e)}")
-            pass
-        return tree
+    except PermissionError:
+        logger.error(f"Permission error accessing {path}")
+        pass
+    except Exception as e:
+        logger.error(f"Error building tree for {path}: {str(e)}")
+        pass
+    return tree
+
+# Last workspace tree as (change signature, tree); endpoints that write or delete
+# files clear it, the signature catches top-level changes made outside the API
+_workspace_cache: Optional[tuple] = None
+# Bumped on every invalidation so a walk that raced a write doesn't store its stale tree
+_workspace_generation = 0
+
+def invalidate_workspace_cache():
+    global _workspace_cache, _workspace_generation
+    _workspace_cache = None
+    _workspace_generation += 1
+
+def workspace_signature(workspace_dir: Path) -> int:
+    """Newest mtime among the workspace directory and its top-level entries"""
+    latest = workspace_dir.stat().st_mtime_ns
+    with os.scandir(workspace_dir) as entries:
+        for entry in entries:
+            latest = max(latest, entry.stat(follow_symlinks=False).st_mtime_ns)
+    return latest
+
+@api_router.get("/workspace")
+async def get_workspace():
+    """Get workspace file tree"""
+    global _workspace_cache
+    workspace_dir = Path(os.path.join(os.environ.get('TEMP', os.path.join(ROOT_DIR, 'temp')), "arduino_workspace"))
+    await asyncio.to_thread(workspace_dir.mkdir, exist_ok=True, parents=True)
+    generation = _workspace_generation
     
-    return {"success": True, "tree": build_tree(workspace_dir)}
+    # Polls only stat the top level unless something changed
+    signature = await asyncio.to_thread(workspace_signature, workspace_dir)
+    if _workspace_cache and _workspace_cache[0] == signature:
+        return {"success": True, "tree": _workspace_cache[1]}
+    
+    # Walk the directory off the event loop
+    tree = await asyncio.to_thread(build_tree, workspace_dir)
+    if generation == _workspace_generation:
+        _workspace_cache = (signature, tree)
+    return {"success": True, "tree": tree}
 
 # WebSocket for serial monitor
+SERIAL_READ_LIMIT = 1 << 20
+
 @app.websocket("/api/serial/{port}")
 async def serial_websocket(websocket: WebSocket, port: str):
     await manager.connect(websocket)
     process = None
     try:
-        # Start serial monitor
-        env = os.environ.copy()
-        bin_path = str(ROOT_DIR.parent / 'bin')
-        env['PATH'] = f"{bin_path};{env.get('PATH', '')}"
-        env['HOME'] = str(ROOT_DIR)
-        
-        # Use arduino-cli.exe on Windows
-        cli_command = 'arduino-cli.exe' if os.name == 'nt' else 'arduino-cli'
-        cli_path = Path(bin_path) / cli_command
-        
-        if not cli_path.exists():
-            error_msg = f"Arduino CLI executable not found at {cli_path}"
-            logger.error(error_msg)
-            await manager.send_personal_message(f"Error: {error_msg}", websocket)
-            return
-        
         # Get baudrate from query parameters (default to 9600)
         query_params = dict(websocket.query_params)
         baudrate = query_params.get('baudrate', '9600')
@@ -591,7 +911,7 @@ async def serial_websocket(websocket: WebSocket, port: str):
         try:
             # Configure serial monitor with appropriate settings
             cmd = [
-                str(cli_path), 'monitor', 
+                CLI_PATH, 'monitor', 
                 '--port', port, 
                 '--config', f"baudrate={baudrate}"
                 # Removed timeout setting that was causing issues
@@ -599,39 +919,32 @@ async def serial_websocket(websocket: WebSocket, port: str):
             
             logger.info(f"Running command: {' '.join(cmd)}")
             
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stdin=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,  # Line buffered
-                env=env
+            # Own session so cleanup can signal any helpers the monitor spawns,
+            # and a 1 MiB read buffer so bursts of serial output don't stall the pipe
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stdin=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=BASE_ENV,
+                limit=SERIAL_READ_LIMIT,
+                start_new_session=True,
+                close_fds=True
             )
+        except FileNotFoundError:
+            logger.error(CLI_NOT_FOUND)
+            await manager.send_personal_message(f"Error: {CLI_NOT_FOUND}", websocket)
+            return
         except Exception as e:
             error_msg = f"Failed to start arduino-cli monitor: {str(e)}"
             logger.error(error_msg)
             await manager.send_personal_message(f"Error: {error_msg}", websocket)
             return
         
-        # Create a task to read from stdout
-        async def read_stdout():
-            while process and process.poll() is None:
-                try:
-                    line = process.stdout.readline()
-                    if line:
-                        await manager.send_personal_message(line.strip(), websocket)
-                except Exception as e:
-                    logger.error(f"Error reading from serial: {e}")
-                    break
-        
-        # Start the stdout reading task
-        read_task = asyncio.create_task(read_stdout())
-        
         # Check if process started successfully
-        if process.poll() is not None:
+        if process.returncode is not None:
             # Process exited immediately
-            error_output = process.stderr.read()
+            error_output = (await process.stderr.read()).decode('utf-8', errors='replace')
             error_msg = f"Failed to connect to port {port}: {error_output}"
             logger.error(error_msg)
             await manager.send_personal_message(f"Error: {error_msg}", websocket)
@@ -640,44 +953,81 @@ async def serial_websocket(websocket: WebSocket, port: str):
         # Send success message
         await manager.send_personal_message(f"Connected to {port} at {baudrate} baud", websocket)
         
-        # Main loop to handle incoming WebSocket messages
-        while True:
-            if process.poll() is not None:
-                error_output = process.stderr.read()
-                if error_output:
-                    logger.error(f"Process error: {error_output}")
-                    await manager.send_personal_message(f"Error: Port monitor error: {error_output}", websocket)
+        # Forward serial output to the WebSocket
+        async def read_stdout():
+            while True:
+                try:
+                    line = await process.stdout.readuntil(b'\n')
+                except asyncio.IncompleteReadError as e:
+                    # End of output: forward whatever trailed the last newline
+                    line = e.partial
+                except asyncio.LimitOverrunError as e:
+                    # No newline within the read buffer: forward the buffered chunk as it is
+                    line = await process.stdout.read(e.consumed or SERIAL_READ_LIMIT)
+                if not line:
+                    break
+                await manager.send_personal_message(line.decode('utf-8', errors='replace').rstrip(), websocket)
+        
+        # Forward WebSocket messages to the serial port
+        async def read_websocket():
+            while True:
+                data = await websocket.receive_text()
+                try:
+                    process.stdin.write((data + '\n').encode('utf-8'))
+                    await process.stdin.drain()
+                    logger.info(f"Sent to serial: {data}")
+                except Exception as e:
+                    logger.error(f"Error sending to serial: {e}")
+                    await manager.send_personal_message(f"Error sending: {str(e)}", websocket)
+        
+        read_task = asyncio.create_task(read_stdout())
+        ws_task = asyncio.create_task(read_websocket())
+        proc_task = asyncio.create_task(process.wait())
+        
+        # Sleep until the client, the monitor or its output finishes; an idle
+        # connection causes no wake-ups at all
+        done, pending = await asyncio.wait(
+            {read_task, ws_task, proc_task},
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        
+        if ws_task in done:
+            error = ws_task.exception()
+            if isinstance(error, WebSocketDisconnect):
+                logger.info(f"WebSocket disconnected for port {port}")
+            else:
+                logger.error(f"Unexpected error in WebSocket loop: {error}")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        else:
+            ws_task.cancel()
+            error = read_task.exception() if read_task in done else None
+            if error is None and proc_task not in done:
+                # Output closed first; give the monitor a moment to exit so its error can be reported
+                await asyncio.wait({proc_task}, timeout=2)
+            
+            if error is not None or not proc_task.done():
+                # The output pump failed or the monitor is still running: stop here and let
+                # the cleanup below terminate it
+                for task in (ws_task, read_task, proc_task):
+                    task.cancel()
+                await asyncio.gather(ws_task, read_task, proc_task, return_exceptions=True)
+                if error is not None:
+                    logger.error(f"Error reading serial output: {error}")
+                    await manager.send_personal_message(f"Error: Serial read failed: {str(error)}", websocket)
                 else:
                     await manager.send_personal_message(f"Serial connection closed", websocket)
-                break
-                
-            # Check for WebSocket messages
-            try:
-                data = await asyncio.wait_for(websocket.receive_text(), timeout=0.1)
-                # Send data to serial port
-                if process and process.poll() is None:
-                    try:
-                        process.stdin.write(data + '\n')
-                        process.stdin.flush()
-                        logger.info(f"Sent to serial: {data}")
-                    except Exception as e:
-                        logger.error(f"Error sending to serial: {e}")
-                        await manager.send_personal_message(f"Error sending: {str(e)}", websocket)
-                else:
-                    await manager.send_personal_message(f"Error: Serial connection is closed", websocket)
-            except asyncio.TimeoutError:
-                continue
-            except WebSocketDisconnect:
-                logger.info(f"WebSocket disconnected for port {port}")
-                break
-            except Exception as e:
-                logger.error(f"Unexpected error in WebSocket loop: {e}")
-                await manager.send_personal_message(f"Error: {str(e)}", websocket)
-                break
-        
-        # Cancel the read task
-        if read_task and not read_task.done():
-            read_task.cancel()
+                return
+            
+            # The monitor exited: stop listening, flush its remaining output and report why
+            await asyncio.gather(ws_task, read_task, return_exceptions=True)
+            error_output = (await process.stderr.read()).decode('utf-8', errors='replace').strip()
+            if error_output:
+                logger.error(f"Process error: {error_output}")
+                await manager.send_personal_message(f"Error: Port monitor error: {error_output}", websocket)
+            else:
+                await manager.send_personal_message(f"Serial connection closed", websocket)
             
     except WebSocketDisconnect:
         logger.info(f"Serial monitor disconnected for port {port}")
@@ -686,379 +1036,120 @@ async def serial_websocket(websocket: WebSocket, port: str):
         await manager.send_personal_message(f"Error: {str(e)}", websocket)
     finally:
         # Clean up
-        if process and process.poll() is None:
+        if process and process.returncode is None:
             try:
-                process.terminate()
-                process.wait(timeout=2)
+                if hasattr(os, 'killpg'):
+                    # Signal the whole process group so no grandchildren are left behind
+                    os.killpg(os.getpgid(process.pid), signal.SIGTERM)
+                else:
+                    process.terminate()
+                await asyncio.wait_for(process.wait(), timeout=2)
             except Exception as e:
                 logger.error(f"Error terminating process: {e}")
                 try:
                     process.kill()
+                    await process.wait()
                 except:
                     pass
         
-        manager.disconnect(websocket)
+        await manager.disconnect(websocket)
         logger.info(f"Serial monitor connection closed for port {port}")
 
 # Circuit Design Routes
-@api_router.get("/components")
+FRITZING_PARTS_DIR = ROOT_DIR / "fritzing-parts"
+
+# Parsed components keyed by id, in scan order; rebuilt only on an explicit refresh
+_COMPONENT_INDEX: Dict[int, Dict] = {}
+_COMPONENTS_BY_FID: Dict[str, Dict] = {}
+_SVG_INDEX: Dict[Tuple[str, str], Path] = {}
+_INDEX_LOCK = asyncio.Lock()
+
+# Serialized /components response for the current index; rebuilding the index clears it
+_COMPONENTS_CACHE: Dict[str, bytes] = {}
+
+# Resized part SVGs, most recently served last: (path, mtime_ns, width, height) -> bytes
+SIZED_SVG_CACHE_SIZE = 256
+_sized_svgs: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+async def _build_component_index(refresh: bool = False) -> Dict[int, Dict]:
+    """Scan the Fritzing parts into the in-memory component index unless it is already built"""
+    if _COMPONENT_INDEX and not refresh:
+        return _COMPONENT_INDEX
+    
+    async with _INDEX_LOCK:
+        # Another request may have finished the scan while this one waited
+        if _COMPONENT_INDEX and not refresh:
+            return _COMPONENT_INDEX
+        
+        # Parsing thousands of part files is CPU and disk bound; keep it off the event loop
+        svg_index = await asyncio.to_thread(scan_svgs, FRITZING_PARTS_DIR)
+        components = await asyncio.to_thread(scan_components, FRITZING_PARTS_DIR, svg_index)
+        _SVG_INDEX.clear()
+        _SVG_INDEX.update(svg_index)
+        _COMPONENT_INDEX.clear()
+        _COMPONENT_INDEX.update((component["id"], component) for component in components)
+        _COMPONENTS_BY_FID.clear()
+        for component in components:
+            # A few parts share a fritzingId (and so their SVGs); the first one scanned answers
+            _COMPONENTS_BY_FID.setdefault(component["fritzingId"], component)
+        _COMPONENTS_CACHE.clear()
+        _sized_svgs.clear()
+        logger.info(f"Indexed {len(components)} Fritzing components")
+    return _COMPONENT_INDEX
+
+@api_router.get("/components", response_class=ORJSONResponse)
 async def get_components():
     """Get all Fritzing components with accurate connector positions and SVG dimensions"""
     try:
-        import os
-        import xml.etree.ElementTree as ET
-        from pathlib import Path
-        import re
-        
-        components = []
-        fritzing_parts_dir = ROOT_DIR / "fritzing-parts"
-        
-        if not fritzing_parts_dir.exists():
+        if not FRITZING_PARTS_DIR.exists():
             return {"success": False, "error": "Fritzing parts directory not found"}
         
-        # Helper function to extract category from filename or properties
-        def extract_category(filename, properties_elem):
-            # Try to categorize by keywords in filename
-            filename_lower = filename.lower()
-            if any(keyword in filename_lower for keyword in ["resistor", "resistance"]):
-                return "Resistors"
-            elif any(keyword in filename_lower for keyword in ["capacitor", "capacitance"]):
-                return "Capacitors"
-            elif any(keyword in filename_lower for keyword in ["led", "light"]):
-                return "LEDs"
-            elif any(keyword in filename_lower for keyword in ["transistor", "mosfet", "fet"]):
-                return "Transistors"
-            elif any(keyword in filename_lower for keyword in ["ic", "chip", "logic"]):
-                return "ICs"
-            elif any(keyword in filename_lower for keyword in ["arduino", "raspberry", "esp", "microcontroller"]):
-                return "Microcontrollers"
-            elif any(keyword in filename_lower for keyword in ["sensor", "detect"]):
-                return "Sensors"
-            elif any(keyword in filename_lower for keyword in ["button", "switch", "potentiometer", "pot"]):
-                return "Input"
-            elif any(keyword in filename_lower for keyword in ["display", "lcd", "led", "oled"]):
-                return "Output"
-            elif any(keyword in filename_lower for keyword in ["connector", "header", "pin", "terminal"]):
-                return "Connectors"
-            elif any(keyword in filename_lower for keyword in ["power", "battery", "voltage", "regulator"]):
-                return "Power"
-            
-            # Try to get category from XML properties
-            if properties_elem is not None:
-                for prop in properties_elem.findall("property"):
-                    if prop.get("name") == "family" and prop.text:
-                        return prop.text
-            
-            # Fallback to directory-based categorization
-            if "core" in str(filename):
-                return "Core"
-            elif "contrib" in str(filename):
-                return "Contrib"
-            elif "user" in str(filename):
-                return "User"
-            
-            return "Miscellaneous"
-        
-        # Helper function to get SVG dimensions
-        def get_svg_dimensions(svg_content):
-            try:
-                if not svg_content:
-                    return {"width": 72, "height": 93.6}  # Default dimensions
-                
-                # Try to parse the SVG content
-                svg_root = ET.fromstring(svg_content)
-                
-                # First try to get dimensions from viewBox
-                viewbox = svg_root.get("viewBox")
-                if viewbox:
-                    parts = viewbox.split(" ")
-                    if len(parts) >= 4:
-                        return {"width": float(parts[2]), "height": float(parts[3])}
-                
-                # If no viewBox, try width and height attributes
-                width = svg_root.get("width")
-                height = svg_root.get("height")
-                
-                if width and height:
-                    # Handle units (px, in, etc.)
-                    width_value = re.match(r'([\d.]+)([a-z]*)', width)
-                    height_value = re.match(r'([\d.]+)([a-z]*)', height)
-                    
-                    if width_value and height_value:
-                        w = float(width_value.group(1))
-                        h = float(height_value.group(1))
-                        
-                        # Convert inches to pixels (assuming 72 DPI)
-                        if width_value.group(2) == 'in':
-                            w *= 72
-                        if height_value.group(2) == 'in':
-                            h *= 72
-                        
-                        return {"width": w, "height": h}
-                
-                return {"width": 72, "height": 93.6}  # Default dimensions
-            except Exception as e:
-                logger.warning(f"Error getting SVG dimensions: {e}")
-                return {"width": 72, "height": 93.6}  # Default dimensions
-        
-        # Helper function to parse connector positions from SVG
-        def parse_connector_positions(svg_content, connectors):
-            if not svg_content or not connectors:
-                return connectors
-            
-            try:
-                svg_root = ET.fromstring(svg_content)
-                
-                # Function to recursively search for elements with matching IDs
-                def find_elements_by_id(element, connector_ids):
-                    results = []
-                    
-                    # Check if current element has an ID that matches any connector
-                    element_id = element.get("id")
-                    if element_id:
-                        for conn_id in connector_ids:
-                            # Match exact ID or pattern like 'connector0pin' for 'connector0'
-                            if element_id == conn_id or (conn_id in element_id and 
-                                                        ("pin" in element_id or "pad" in element_id)):
-                                results.append((element, conn_id))
-                    
-                    # Recursively check children
-                    for child in element:
-                        results.extend(find_elements_by_id(child, connector_ids))
-                    
-                    return results
-                
-                # Get all connector IDs
-                connector_ids = [conn["id"] for conn in connectors]
-                
-                # Find elements with matching IDs
-                matching_elements = find_elements_by_id(svg_root, connector_ids)
-                
-                # Extract positions from matching elements
-                for element, conn_id in matching_elements:
-                    # Find the connector in our list
-                    connector = next((c for c in connectors if c["id"] == conn_id), None)
-                    if not connector:
-                        continue
-                    
-                    # Extract position based on element type
-                    x, y = None, None
-                    
-                    # For circle elements (common for pins)
-                    if element.tag.endswith("circle"):
-                        x = float(element.get("cx", 0))
-                        y = float(element.get("cy", 0))
-                    
-                    # For rect elements
-                    elif element.tag.endswith("rect"):
-                        x = float(element.get("x", 0)) + float(element.get("width", 0)) / 2
-                        y = float(element.get("y", 0)) + float(element.get("height", 0)) / 2
-                    
-                    # For path elements, use first point
-                    elif element.tag.endswith("path"):
-                        d = element.get("d", "")
-                        if d and d.startswith("M"):
-                            parts = d.split(" ")
-                            if len(parts) >= 3:
-                                try:
-                                    x = float(parts[1])
-                                    y = float(parts[2].split(",")[0])
-                                except ValueError:
-                                    pass
-                    
-                    # For line elements
-                    elif element.tag.endswith("line"):
-                        x = float(element.get("x1", 0))
-                        y = float(element.get("y1", 0))
-                    
-                    # For other elements with x,y attributes
-                    else:
-                        x = float(element.get("x", 0))
-                        y = float(element.get("y", 0))
-                    
-                    # Update connector position if found
-                    if x is not None and y is not None:
-                        connector["x"] = x
-                        connector["y"] = y
-                
-                return connectors
-            except Exception as e:
-                logger.warning(f"Error parsing connector positions: {e}")
-                return connectors
+        # Normally built at startup; scan now if that didn't happen
+        index = await _build_component_index()
         
-        # Process all FZP files
-        for fzp_file in fritzing_parts_dir.glob("**/*.fzp"):
-            try:
-                tree = ET.parse(fzp_file)
-                root = tree.getroot()
-                
-                # Extract basic component info
-                component_id = len(components) + 1
-                fritzingId = fzp_file.stem
-                title = root.get("title", fzp_file.stem)
-                description = root.get("description", "")
-                
-                # Get properties element for category extraction
-                properties_elem = root.find(".//properties")
-                category = extract_category(str(fzp_file), properties_elem)
-                
-                # Extract tags
-                tags = []
-                tags_elem = root.find(".//tags")
-                if tags_elem is not None:
-                    for tag in tags_elem.findall("tag"):
-                        if tag.text:
-                            tags.append(tag.text)
-                
-                # Initialize component
-                component = {
-                    "id": component_id,
-                    "fritzingId": fritzingId,
-                    "title": title,
-                    "description": description,
-                    "category": category,
-                    "tags": tags,
-                    "iconUrl": f"/api/components/{component_id}/svg/icon",
-                    "breadboardUrl": f"/api/components/{component_id}/svg/breadboard",
-                    "connectors": [],
-                    "properties": {},
-                    "dimensions": {"width": 72, "height": 93.6}  # Default dimensions
-                }
-                
-                # Extract connectors
-                connectors_elem = root.find(".//connectors")
-                if connectors_elem is not None:
-                    for connector in connectors_elem.findall("connector"):
-                        conn_id = connector.get("id", "")
-                        conn_name = connector.get("name", conn_id)
-                        conn_type = connector.get("type", "male")
-                        
-                        # Try to get breadboard position
-                        bb_elem = connector.find(".//p[@layer='breadboard']")
-                        x, y = 0, 0
-                        if bb_elem is not None:
-                            x = float(bb_elem.get("x", 0))
-                            y = float(bb_elem.get("y", 0))
-                        
-                        component["connectors"].append({
-                            "id": conn_id,
-                            "name": conn_name,
-                            "x": x,
-                            "y": y,
-                            "type": conn_type
-                        })
-                
-                # Extract properties
-                if properties_elem is not None:
-                    for prop in properties_elem.findall("property"):
-                        prop_name = prop.get("name")
-                        if prop_name and prop.text:
-                            component["properties"][prop_name] = prop.text
-                
-                # Get SVG content for dimensions and connector positions
-                svg_filename = f"{fritzingId}.svg"
-                svg_paths = [
-                    fritzing_parts_dir / "svg" / "core" / "breadboard" / svg_filename,
-                    fritzing_parts_dir / "svg" / "contrib" / "breadboard" / svg_filename,
-                    fritzing_parts_dir / "svg" / "user" / "breadboard" / svg_filename,
-                    fritzing_parts_dir / "svg" / "obsolete" / "breadboard" / svg_filename
-                ]
-                
-                svg_content = None
-                for svg_path in svg_paths:
-                    if svg_path.exists():
-                        with open(svg_path, "r", encoding="utf-8") as f:
-                            svg_content = f.read()
-                        break
-                
-                if svg_content:
-                    # Get SVG dimensions
-                    component["dimensions"] = get_svg_dimensions(svg_content)
-                    
-                    # Update connector positions from SVG
-                    component["connectors"] = parse_connector_positions(svg_content, component["connectors"])
-                
-                components.append(component)
-            except Exception as e:
-                logger.warning(f"Failed to parse {fzp_file}: {e}")
-                continue
-        
-        return {"success": True, "components": components}
+        # The list is large and only changes on a rescan, so serialize it once
+        payload = _COMPONENTS_CACHE.get("payload")
+        if payload is None:
+            payload = orjson.dumps({"success": True, "components": list(index.values())})
+            _COMPONENTS_CACHE["payload"] = payload
+        return Response(content=payload, media_type="application/json")
     except Exception as e:
         logger.error(f"Error fetching components: {e}")
         return {"success": False, "error": str(e)}
 
-@api_router.get("/components/{component_id}/svg/{svg_type}")
-async def get_component_svg(component_id: int, svg_type: str):
+@api_router.get("/components/{fritzing_id}/svg/{svg_type}")
+async def get_component_svg(fritzing_id: str, svg_type: str, request: Request):
     """Get component SVG for breadboard/schematic view with proper dimensions and scaling"""
     try:
-        from fastapi.responses import Response
-        import os
-        from pathlib import Path
-        import xml.etree.ElementTree as ET
-        
-        # Get the component from the list
-        components = []
-        fritzing_parts_dir = ROOT_DIR / "fritzing-parts"
+        fritzing_parts_dir = FRITZING_PARTS_DIR
         
         if not fritzing_parts_dir.exists():
             raise FileNotFoundError("Fritzing parts directory not found")
         
-        # Find the component with the given ID
-        component = None
-        component_count = 0
-        
-        for fzp_file in fritzing_parts_dir.glob("**/*.fzp"):
-            component_count += 1
-            if component_count == component_id:
-                try:
-                    tree = ET.parse(fzp_file)
-                    root = tree.getroot()
-                    component = {
-                        "id": component_id,
-                        "fritzingId": fzp_file.stem,
-                        "path": fzp_file,
-                        "title": root.get("title", fzp_file.stem),
-                        "dimensions": {"width": 72, "height": 93.6}  # Default dimensions
-                    }
-                    break
-                except Exception as e:
-                    logger.warning(f"Failed to parse {fzp_file}: {e}")
+        # Find the component with the given Fritzing ID
+        await _build_component_index()
+        component = _COMPONENTS_BY_FID.get(fritzing_id)
         
         if not component:
             # Fallback to placeholder if component not found
             placeholder_svg = f'''<?xml version="1.0" encoding="UTF-8"?>
 <svg width="64" height="64" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 64 64">
     <rect x="4" y="4" width="56" height="56" fill="#666" stroke="#333" stroke-width="2" rx="4"/>
-    <text x="32" y="35" text-anchor="middle" fill="white" font-size="10">C{component_id}</text>
+    <text x="32" y="35" text-anchor="middle" fill="white" font-size="10">{html.escape(fritzing_id)}</text>
 </svg>'''
             return Response(content=placeholder_svg, media_type="image/svg+xml")
         
-        # Determine the SVG path based on the component and view type
-        svg_filename = f"{component['fritzingId']}.svg"
-        
-        # Check in different possible locations
-        svg_paths = [
-            fritzing_parts_dir / "svg" / "core" / svg_type / svg_filename,
-            fritzing_parts_dir / "svg" / "contrib" / svg_type / svg_filename,
-            fritzing_parts_dir / "svg" / "user" / svg_type / svg_filename,
-            fritzing_parts_dir / "svg" / "obsolete" / svg_type / svg_filename
-        ]
+        # Look up the SVG for the component and view type
+        svg_stat = None
+        svg_path = _SVG_INDEX.get((fritzing_id, svg_type))
+        if svg_path is not None:
+            svg_stat = await asyncio.to_thread(svg_path.stat)
         
-        svg_content = None
-        svg_path_found = None
-        for svg_path in svg_paths:
-            if svg_path.exists():
-                with open(svg_path, "r", encoding="utf-8") as f:
-                    svg_content = f.read()
-                svg_path_found = svg_path
-                break
-        
-        if not svg_content:
+        if not svg_stat or not svg_stat.st_size:
             # Fallback to placeholder if SVG not found
             width = component.get("dimensions", {}).get("width", 64)
             height = component.get("dimensions", {}).get("height", 64)
-            title = component.get("title", f"C{component_id}")
+            title = html.escape(component.get("title", fritzing_id))
             placeholder_svg = f'''<?xml version="1.0" encoding="UTF-8"?>
 <svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}">
     <rect x="4" y="4" width="{width-8}" height="{height-8}" fill="#666" stroke="#333" stroke-width="2" rx="4"/>
@@ -1066,33 +1157,44 @@ async def get_component_svg(component_id: int, svg_type: str):
 </svg>'''
             return Response(content=placeholder_svg, media_type="image/svg+xml")
         
+        # Get or set dimensions
+        width = component.get("dimensions", {}).get("width", 72)
+        height = component.get("dimensions", {}).get("height", 93.6)
+        
+        # The body depends on the file and the part's breadboard size, so let browsers
+        # cache it and revalidate against both
+        etag = f'"{svg_stat.st_ino}-{svg_stat.st_mtime_ns}-{width}-{height}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(svg_stat.st_mtime, usegmt=True),
+            "Cache-Control": "public, max-age=3600",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))):
+            return Response(status_code=304, headers=headers)
+        
+        # Repeat requests reuse the resized bytes until the file changes
+        cache_key = (svg_path, svg_stat.st_mtime_ns, width, height)
+        svg_content = _sized_svgs.get(cache_key)
+        if svg_content is not None:
+            _sized_svgs.move_to_end(cache_key)
+            return Response(content=svg_content, media_type="image/svg+xml", headers=headers)
+        
+        svg_content = await asyncio.to_thread(svg_path.read_bytes)
+        
         # Process the SVG to ensure it has proper dimensions and viewBox
         try:
-            # Parse the SVG
-            svg_root = ET.fromstring(svg_content)
-            
-            # Get or set dimensions
-            width = component.get("dimensions", {}).get("width", 72)
-            height = component.get("dimensions", {}).get("height", 93.6)
-            
-            # Check if SVG has viewBox attribute
-            viewbox = svg_root.get("viewBox")
-            if not viewbox:
-                # If no viewBox, create one based on width and height
-                svg_root.set("viewBox", f"0 0 {width} {height}")
-            
-            # Ensure width and height attributes are set
-            svg_root.set("width", str(width))
-            svg_root.set("height", str(height))
-            
-            # Convert back to string
-            svg_content = ET.tostring(svg_root, encoding="unicode")
+            # Only the root tag changes, so patch it in place rather than round-tripping the document
+            svg_content = set_svg_size(svg_content, width, height)
+            _sized_svgs[cache_key] = svg_content
+            if len(_sized_svgs) > SIZED_SVG_CACHE_SIZE:
+                _sized_svgs.popitem(last=False)
         except Exception as e:
             logger.warning(f"Error processing SVG dimensions: {e}")
             # Continue with original SVG if processing fails
             pass
         
-        return Response(content=svg_content, media_type="image/svg+xml")
+        return Response(content=svg_content, media_type="image/svg+xml", headers=headers)
     except Exception as e:
         logger.error(f"Error fetching component SVG: {e}")
         # Return placeholder on error
@@ -1105,11 +1207,13 @@ async def get_component_svg(component_id: int, svg_type: str):
 
 @api_router.post("/components/load")
 async def load_components():
-    """Load Fritzing components"""
+    """Rescan the Fritzing parts directory and rebuild the component index"""
     try:
-        # This endpoint is just a placeholder to match the frontend's expectation
-        # The actual component loading happens in the GET /components endpoint
-        return {"success": True, "message": "Components loaded successfully"}
+        if not FRITZING_PARTS_DIR.exists():
+            return {"success": False, "error": "Fritzing parts directory not found"}
+        
+        index = await _build_component_index(refresh=True)
+        return {"success": True, "message": f"Loaded {len(index)} components"}
     except Exception as e:
         logger.error(f"Error loading components: {e}")
         return {"success": False, "error": str(e)}
@@ -1131,11 +1235,11 @@ async def save_svg(request: Request):
         
         # Create the path within arduino_workspace
         file_path = Path(ARDUINO_WORKSPACE) / file_name
-        file_path.parent.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(file_path.parent.mkdir, parents=True, exist_ok=True)
         
-        # Write the SVG content to the file
-        with open(file_path, "w") as f:
-            f.write(svg_content)
+        # Write the SVG content to the file as UTF-8, byte for byte
+        await asyncio.to_thread(file_path.write_bytes, svg_content.encode("utf-8"))
+        invalidate_workspace_cache()
         
         logger.info(f"SVG file saved successfully: {file_path}")
         return {"success": True, "path": str(file_path)}
@@ -1154,7 +1258,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_event():
+    # Sketch directories from a previous run aren't tracked, so clear them out
+    await asyncio.to_thread(remove_stale_sketch_dirs)
+    
+    # The parts library is read-only at runtime, so index it once up front
+    if FRITZING_PARTS_DIR.exists():
+        try:
+            await _build_component_index()
+        except Exception as e:
+            logger.error(f"Error indexing components: {e}")
+
 @app.on_event("shutdown")
 async def shutdown_event():
     # Cleanup resources if needed
-    pass
\ No newline at end of file
+    pass
+
+if __name__ == "__main__":
+    import importlib.util
+    import uvicorn
+    
+    # uvloop is a libuv-based event loop; it isn't available on Windows
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    
+    # Keep a single worker: serial connections, the arduino-cli cache and the
+    # component index are process-local, so extra workers would each hold their
+    # own copy and broadcasts wouldn't reach clients on other workers
+    uvicorn.run(
+        app,
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        loop=loop,
+        http="httptools",
+        workers=1
+    )
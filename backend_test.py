@@ -9,6 +9,7 @@ import json
 import time
 import sys
 from pathlib import Path
+from urllib.parse import quote
 
 # Backend URL from frontend/.env
 BACKEND_URL = "https://5ab4535e-6a2b-4d01-a635-d570a7105a46.preview.emergentagent.com/api"
@@ -130,10 +131,6 @@ void loop() {
         # Test components endpoint
         self.results["circuit_designer"]["components"] = self.test_endpoint("GET", "/components")
         
-        # Test component SVG endpoints (test with component ID 1)
-        self.results["circuit_designer"]["component_svg_icon"] = self.test_endpoint("GET", "/components/1/svg/icon")
-        self.results["circuit_designer"]["component_svg_breadboard"] = self.test_endpoint("GET", "/components/1/svg/breadboard")
-        
         # Validate components structure if successful
         components_result = self.results["circuit_designer"]["components"]
         if components_result.get("success") and isinstance(components_result.get("data"), dict):
@@ -155,6 +152,17 @@ void loop() {
                         
                     # Log sample component info
                     self.log(f"Sample component: {sample_component.get('title', 'Unknown')} (ID: {sample_component.get('id')})")
+                    
+                    # Test component SVG endpoints (SVGs are looked up by Fritzing ID)
+                    fritzing_id = quote(str(sample_component.get("fritzingId", "")), safe="")
+                    self.results["circuit_designer"]["component_svg_icon"] = self.test_endpoint("GET", f"/components/{fritzing_id}/svg/icon")
+                    self.results["circuit_designer"]["component_svg_breadboard"] = self.test_endpoint("GET", f"/components/{fritzing_id}/svg/breadboard")
+                    
+                    # Parts without an SVG for a view get a grey placeholder rectangle
+                    for view in ("icon", "breadboard"):
+                        svg_result = self.results["circuit_designer"][f"component_svg_{view}"]
+                        if 'fill="#666" stroke="#333"' in str(svg_result.get("data", "")):
+                            self.log(f"WARNING: {view} SVG for {fritzing_id} is a placeholder", "WARN")
             else:
                 self.log("WARNING: Components API returned success=false or no components", "WARN")
         
@@ -44,6 +44,7 @@ const CircuitCanvas = ({ onBack }) => {
       const newComponent = {
         id: `component-${Date.now()}`,
         componentId: componentData.id,
+        fritzingId: componentData.fritzingId,
         title: componentData.title,
         x: Math.round(x - 32), // Center the component
         y: Math.round(y - 32),
@@ -191,7 +192,7 @@ const CircuitCanvas = ({ onBack }) => {
                 >
                   <div className="flex items-center">
                     <img
-                      src={`${API}/components/${component.id}/svg/breadboard`}
+                      src={`${API}/components/${encodeURIComponent(component.fritzingId)}/svg/breadboard`}
                       alt={component.title}
                       className="w-8 h-8 mr-2"
                       onError={(e) => {
@@ -278,7 +279,7 @@ const CircuitCanvas = ({ onBack }) => {
               onClick={() => handleComponentClick(placedComponent)}
             >
               <img
-                src={`${API}/components/${placedComponent.componentId}/svg/breadboard`}
+                src={`${API}/components/${encodeURIComponent(placedComponent.fritzingId)}/svg/breadboard`}
                 alt={placedComponent.title}
                 className="w-16 h-16"
                 onError={(e) => {
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The backend runs from its own directory; make its modules importable the same way
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
@@ -0,0 +1,35 @@
+from lxml import etree
+
+from fritzing_parts import parse_connector_positions
+
+
+def positions(svg: bytes, *ids):
+    connectors = [{"id": conn_id, "x": 0, "y": 0} for conn_id in ids]
+    parse_connector_positions(etree.fromstring(svg), connectors)
+    return {conn["id"]: (conn["x"], conn["y"]) for conn in connectors}
+
+
+def test_connector10pin_is_not_taken_for_connector1():
+    svg = (b'<svg xmlns="http://www.w3.org/2000/svg">'
+           b'<circle id="connector10pin" cx="100" cy="200" r="1"/>'
+           b'<circle id="connector1pin" cx="10" cy="20" r="1"/>'
+           b'</svg>')
+    found = positions(svg, "connector1", "connector10")
+    assert found["connector1"] == (10.0, 20.0)
+    assert found["connector10"] == (100.0, 200.0)
+
+
+def test_exact_id_matches():
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg"><rect id="connector2" x="4" y="6" width="2" height="4"/></svg>'
+    assert positions(svg, "connector2")["connector2"] == (5.0, 8.0)
+
+
+def test_path_start_with_space_and_comma():
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg"><path id="connector0pin" d="M 3.5,7.25 L 9,9"/></svg>'
+    assert positions(svg, "connector0")["connector0"] == (3.5, 7.25)
+
+
+def test_path_start_without_space():
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg"><path id="connector0pin" d="M3.5,7.25L9,9"/></svg>'
+    assert positions(svg, "connector0")["connector0"] == (3.5, 7.25)
+
@@ -0,0 +1,74 @@
+import time
+
+from lxml import etree
+
+from fritzing_parts import set_svg_size
+
+
+def root_of(svg: bytes):
+    return etree.fromstring(set_svg_size(svg, 21.6, 43.2))
+
+
+def test_adds_viewbox_when_missing():
+    root = root_of(b'<svg xmlns="http://www.w3.org/2000/svg" width="0.3in" height="0.6in"><g/></svg>')
+    assert root.get("width") == "21.6"
+    assert root.get("height") == "43.2"
+    assert root.get("viewBox") == "0 0 21.6 43.2"
+
+
+def test_replaces_empty_viewbox():
+    root = root_of(b'<svg width="1in" height="2in" viewBox=""/>')
+    assert root.get("viewBox") == "0 0 21.6 43.2"
+
+
+def test_keeps_existing_viewbox():
+    root = root_of(b'<svg width="1in" height="2in" viewBox="0 0 10 20"/>')
+    assert root.get("viewBox") == "0 0 10 20"
+    assert root.get("width") == "21.6"
+
+
+def test_leaves_stroke_width_alone():
+    svg = b'<svg stroke-width="3" width="1in" height="2in" viewBox="0 0 1 2"><rect stroke-width="5"/></svg>'
+    out = set_svg_size(svg, 21.6, 43.2)
+    root = etree.fromstring(out)
+    assert root.get("stroke-width") == "3"
+    assert root[0].get("stroke-width") == "5"
+    assert root.get("width") == "21.6"
+
+
+def test_single_quoted_attributes():
+    root = root_of(b"<svg width='1in' height='2in' viewBox=''><g/></svg>")
+    assert root.get("width") == "21.6"
+    assert root.get("height") == "43.2"
+    assert root.get("viewBox") == "0 0 21.6 43.2"
+
+
+def test_only_root_tag_changes():
+    svg = b'<?xml version="1.0"?>\n<!-- <svg width="9"> -->\n<svg width="1in" height="2in" viewBox="0 0 1 2"><svg width="5"/></svg>'
+    out = set_svg_size(svg, 21.6, 43.2)
+    assert out.startswith(b'<?xml version="1.0"?>\n<!-- <svg width="9"> -->\n<svg ')
+    assert out.endswith(b'<svg width="5"/></svg>')
+    assert etree.fromstring(out).get("width") == "21.6"
+
+
+def test_skips_doctype_before_root():
+    svg = (b'<?xml version="1.0"?>\n<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" '
+           b'"http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">\n<svg width="1in" height="2in"/>')
+    out = set_svg_size(svg, 21.6, 43.2)
+    assert b'svg11.dtd">\n<svg width="21.6" height="43.2" viewBox="0 0 21.6 43.2"/>' in out
+
+
+def test_long_prolog_before_non_svg_root_fails_fast():
+    svg = b" " * 50000 + b"<!-- a -->" * 2000 + b"<?pi x?>" * 2000 + b"<html/>"
+    start = time.perf_counter()
+    assert set_svg_size(svg, 21.6, 43.2) is svg
+    assert time.perf_counter() - start < 1
+
+
+def test_already_sized_svg_is_returned_unchanged():
+    svg = b'<svg width="21.6" height="43.2" viewBox="0 0 21.6 43.2"/>'
+    assert set_svg_size(svg, 21.6, 43.2) is svg
+
+
+def test_non_svg_content_is_returned_unchanged():
+    assert set_svg_size(b"not an svg", 1, 2) == b"not an svg"